@@ -29,4 +29,11 @@ reference_layers = [
         "url": "https://api.openweathermap.org/data/2.5/weather",
     }
 
-]
\ No newline at end of file
+]
+
+# per-host overrides of the upstream client defaults (see utils/upstream_client.py)
+upstream_limits = {
+    "apps.fs.usda.gov": {"rate": 5, "burst": 10, "timeout": (5, 60), "query_timeout": 300},
+    "portal.opentopography.org": {"rate": 1, "burst": 2, "timeout": (5, 120), "max_retries": 2},
+    "api.openweathermap.org": {"rate": 1, "burst": 5, "timeout": (5, 10)},
+}
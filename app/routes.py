@@ -13,6 +13,8 @@ from flask import (
 )
 from app.utils.data_fetcher import DataFetcher
 from app.utils.data_processor import DataProcessor
+from app.utils.upstream_client import upstream
+from app.utils.geometry_simplifier import GeometrySimplifier, DETAIL_LEVELS, DEFAULT_DETAIL
 from app.reference_layers import reference_layers
 
 routes = Blueprint("routes", __name__)
@@ -25,6 +27,7 @@ MAPBOX_API_KEY = os.getenv("MAPBOX_API_KEY")
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 
 data_fetcher = DataFetcher()
+geometry_simplifier = GeometrySimplifier()
 
 LOG_DIR = "logs"
 LOG_FILE = os.path.join(LOG_DIR, "app.log")
@@ -96,6 +99,42 @@ def perform_processing(selected_segments, session_id):
 
 
 
+def parse_detail_args(args):
+    """reads the optional ?detail=, ?zoom= and ?bbox=minX,minY,maxX,maxY query params."""
+    detail = args.get("detail")
+    zoom = args.get("zoom", type=float)
+
+    if detail is None:
+        detail = GeometrySimplifier.level_for_zoom(zoom) if zoom is not None else DEFAULT_DETAIL
+    elif detail not in DETAIL_LEVELS:
+        raise ValueError(f"Invalid detail level. Expected one of {list(DETAIL_LEVELS)}.")
+
+    bbox = args.get("bbox")
+    if bbox:
+        try:
+            bbox = [float(v) for v in bbox.split(",")]
+        except ValueError:
+            bbox = None
+        if not bbox or len(bbox) != 4:
+            raise ValueError("Invalid bbox format. Expected minX,minY,maxX,maxY.")
+
+    return detail, bbox or None
+
+def parse_layers_arg(args, files):
+    """limits files to the optional ?layers=a,b query param."""
+    layers = args.get("layers")
+    if not layers:
+        return files
+
+    requested = [layer.strip() for layer in layers.split(",") if layer.strip()]
+    unknown = [layer for layer in requested if layer not in files]
+    if unknown:
+        raise ValueError(f"Invalid layers {unknown}. Expected any of {list(files)}.")
+
+    return {key: path for key, path in files.items() if key in requested}
+
+
+
 ### ----------------------------------------
 ### 🔹 Core App Routes
 ### ----------------------------------------
@@ -170,6 +209,15 @@ def fetch_trails():
                 gdf = gdf.to_crs(epsg=4326)
             gdf.to_file(path, driver="GeoJSON")
 
+        try:
+            geometry_simplifier.precompute([
+                "/tmp/data/processed/fetched_trails.geojson",
+                "/tmp/data/processed/roads.geojson"
+            ])
+        except Exception as e:
+            #levels are built lazily on the first map load anyway
+            log.warning(f"could not precompute detail levels: {str(e)}")
+
         return jsonify({"redirect": url_for('routes.selections')})
 
     except Exception as e:
@@ -178,20 +226,29 @@ def fetch_trails():
     
 @routes.route("/api/get_saved_trails", methods=["GET"])
 def get_saved_trails():
-    """Serve the previously saved trails, roads, and trailheads."""
+    """Serve the previously saved trails, roads, and trailheads at the requested detail level."""
+    files = {
+        "trails": "/tmp/data/processed/fetched_trails.geojson",
+        "roads": "/tmp/data/processed/roads.geojson",
+        "trailheads": "/tmp/data/processed/fetched_trailheads.geojson"
+    }
+
+    #trails & roads connect to each other, junctions between them are kept when simplifying
+    networks = {"trails": [files["roads"]], "roads": [files["trails"]]}
+
     try:
-        files = {
-            "trails": "/tmp/data/processed/fetched_trails.geojson",
-            "roads": "/tmp/data/processed/roads.geojson",
-            "trailheads": "/tmp/data/processed/fetched_trailheads.geojson"
-        }
+        detail, bbox = parse_detail_args(request.args)
+        requested_files = parse_layers_arg(request.args, files)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
+    try:
         saved_data = {}
 
-        for key, path in files.items():
+        for key, path in requested_files.items():
             if os.path.exists(path):
-                log.info(f"Loading {key} from {path}")
-                saved_data[key] = json.loads(gpd.read_file(path).to_json())
+                log.info(f"Loading {key} from {path} ({detail} detail)")
+                saved_data[key] = geometry_simplifier.get_geojson(path, detail, bbox, networks.get(key, []))
             else:
                 log.warning(f"no saved {key} found at {path}")
 
@@ -229,6 +286,11 @@ def process_route():
             log.info("Filtering trailheads...")
             processor.process_route()
 
+            try:
+                geometry_simplifier.precompute([final_route_path])
+            except Exception as e:
+                log.warning(f"could not precompute detail levels: {str(e)}")
+
             processing_status[session_id] = True
             log.info("all processing steps completed successfully.")
 
@@ -242,18 +304,24 @@ def process_route():
 
 @routes.route("/api/get_adventure_data", methods=["GET"])
 def get_adventure_data():
-    """Serves the final enriched route and filtered trailheads (as POIs)."""
+    """Serves the final enriched route and filtered trailheads (as POIs) at the requested detail level."""
+    files = {
+        "trails": "/tmp/data/processed/final_trip.geojson",
+        "pois": "/tmp/data/processed/filtered_trailheads.geojson"
+    }
+
     try:
-        files = {
-            "trails": "/tmp/data/processed/final_trip.geojson",
-            "pois": "/tmp/data/processed/filtered_trailheads.geojson"
-        }
+        detail, bbox = parse_detail_args(request.args)
+        requested_files = parse_layers_arg(request.args, files)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
+    try:
         adventure_data = {}
-        for key, path in files.items():
+        for key, path in requested_files.items():
             if os.path.exists(path):
-                log.info(f"📂 Loading {key} from {path}")
-                adventure_data[key] = json.loads(gpd.read_file(path).to_json())
+                log.info(f"📂 Loading {key} from {path} ({detail} detail)")
+                adventure_data[key] = geometry_simplifier.get_geojson(path, detail, bbox)
             else:
                 log.warning(f"⚠️ No saved {key} found at {path}")
 
@@ -282,9 +350,8 @@ def get_weather():
         open_weather_url = reference_layers[1]["url"]
 
         # query open weather api for area forecast
-        weather_url = f"{open_weather_url}?lat={centroid_lat}&lon={centroid_lon}&appid={OPENWEATHER_API_KEY}&units=imperial"
-        response = requests.get(weather_url)
-        response.raise_for_status()
+        params = {"lat": centroid_lat, "lon": centroid_lon, "appid": OPENWEATHER_API_KEY, "units": "imperial"}
+        response = upstream.get(open_weather_url, params=params)
         weather_data = response.json()
 
         forecast = {
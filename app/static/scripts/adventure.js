@@ -26,7 +26,7 @@ map.on("load", function () {
   map.setTerrain({ source: "mapbox-dem", exaggeration: 2.0 });
   console.log("3D Terrain Enabled with Southward Orientation");
 
-  fetch("/api/get_adventure_data")
+  fetch(`/api/get_adventure_data?zoom=${map.getZoom()}`)
     .then((response) => response.json())
     .then((data) => {
       if (!data.trails || !data.trails.features) {
@@ -43,6 +43,9 @@ map.on("load", function () {
 
       //fetch weather separately
       fetchWeatherForecast();
+
+      //swap in the detail level for the current zoom & viewport
+      map.on("moveend", refreshTrailDetail);
     })
     .catch((error) => console.error("❌ Error loading adventure data:", error));
 });
@@ -188,6 +191,22 @@ function addPOILayer(pois) {
   });
 }
 
+// refetch the route at the detail level for the current zoom, clipped to the viewport
+let detailRequestId = 0;
+function refreshTrailDetail() {
+  const requestId = ++detailRequestId;
+  const bbox = getMapBoundingBox().join(",");
+
+  fetch(`/api/get_adventure_data?zoom=${map.getZoom()}&bbox=${bbox}&layers=trails`)
+    .then((response) => response.json())
+    .then((data) => {
+      //ignore responses superseded by a newer move
+      if (requestId !== detailRequestId || !data.trails) return;
+      map.getSource("final-trails").setData(data.trails);
+    })
+    .catch((error) => console.error("❌ Error refreshing trail detail:", error));
+}
+
 // get trail/road names and mileage to display
 function populateSidebar(trails) {
   const trailsList = document.getElementById("selected-trails-list");
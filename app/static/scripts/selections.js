@@ -34,7 +34,7 @@ map.on("load", function () {
   console.log("3D Terrain Enabled with Southward Orientation");
 
   //load the saved trails, roads & trailheads dedicated endpoint
-  fetch("/api/get_saved_trails")
+  fetch(`/api/get_saved_trails?zoom=${map.getZoom()}`)
     .then((response) => response.json())
     .then((data) => {
       if (data.error) {
@@ -93,10 +93,37 @@ map.on("load", function () {
       });
 
       console.log("Trails, Roads & Trailheads loaded onto selection map.");
+
+      //swap in the detail level for the current zoom & viewport
+      map.on("moveend", refreshSegmentDetail);
     })
     .catch((error) => console.error("Error loading saved trails:", error));
 });
 
+//refetch trails & roads at the detail level for the current zoom, clipped to the viewport.
+//feature ids are stable across detail levels so selected feature states carry over
+let detailRequestId = 0;
+function refreshSegmentDetail() {
+  const requestId = ++detailRequestId;
+  const bounds = map.getBounds();
+  const bbox = [
+    bounds.getWest(),
+    bounds.getSouth(),
+    bounds.getEast(),
+    bounds.getNorth(),
+  ].join(",");
+
+  fetch(`/api/get_saved_trails?zoom=${map.getZoom()}&bbox=${bbox}&layers=trails,roads`)
+    .then((response) => response.json())
+    .then((data) => {
+      //ignore responses superseded by a newer move
+      if (requestId !== detailRequestId || data.error) return;
+      if (data.trails) map.getSource("ohv-trails").setData(data.trails);
+      if (data.roads) map.getSource("roads").setData(data.roads);
+    })
+    .catch((error) => console.error("Error refreshing trail detail:", error));
+}
+
 //handle selection of both trails & roads
 function toggleSegmentSelection(layerId, feature) {
   const mapboxId = feature.id; //mbox ID for feature state
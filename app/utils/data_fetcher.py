@@ -1,12 +1,15 @@
 import os
+import re
 import logging
 import geopandas as gpd
 import json
+from urllib.parse import urlparse
 from arcgis.gis import GIS
 from arcgis.features import FeatureLayer
 from arcgis.geometry.filters import intersects
 from app.reference_layers import trails_roads
 from app.reference_layers import reference_layers
+from app.utils.upstream_client import upstream, RETRY, RAISE
 
 class DataFetcher:
     def __init__(self):
@@ -30,7 +33,17 @@ class DataFetcher:
             }
             
             query_filter = intersects(bbox_dict, sr=wkid)
-            features = feature_layer.query(geometry_filter=query_filter, out_sr=wkid, out_fields=layer['fields'])
+            #coalesce identical concurrent queries and apply the host's rate limit/retries.
+            #a query pages through many requests, so the whole query gets its own (larger) time limit
+            host = urlparse(layer['url']).netloc
+            query_key = ("arcgis", layer['url'], upstream.normalize_params(bbox_dict), tuple(layer['fields']))
+            features = upstream.call(
+                host,
+                query_key,
+                lambda: feature_layer.query(geometry_filter=query_filter, out_sr=wkid, out_fields=layer['fields']),
+                timeout=upstream.host_limits(host)["query_timeout"],
+                classify=self.classify_arcgis_error
+            )
 
             #convert to gdf
             gdf = self.gdf_from_feature_layer(features, wkid)
@@ -47,6 +60,25 @@ class DataFetcher:
             self.logger.error(f"Error fetching {layer['name']}: {e}")
             return None
 
+    @staticmethod
+    def classify_arcgis_error(error):
+        """arcgis wraps server errors in its own exceptions, map them onto the upstream client's classes."""
+        kind = upstream.classify_error(error)
+        if kind != RAISE:
+            return kind
+
+        message = str(error)
+        status = re.search(r"Error Code: (\d{3})", message)
+        if status:
+            code = int(status.group(1))
+            return RETRY if code == 429 or code >= 500 else RAISE
+
+        #server side failures without a code
+        transient = ["Error performing query", "Unable to complete operation", "timed out", "Max retries exceeded"]
+        if any(text.lower() in message.lower() for text in transient):
+            return RETRY
+        return RAISE
+
     def gdf_from_feature_layer(self, feature_layer, wkid=4326):
         """converts esri flayer response to gdf in 4326"""
         if feature_layer.features:
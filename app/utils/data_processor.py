@@ -5,9 +5,14 @@ import rasterio
 from rasterio.transform import rowcol
 import requests
 import os
+import math
+import shutil
+import tempfile
 import numpy as np
-from shapely.geometry import MultiLineString, LineString
+from concurrent.futures import ThreadPoolExecutor
+from shapely.geometry import MultiLineString, LineString, box
 from app.reference_layers import reference_layers
+from app.utils.upstream_client import upstream
 
 log = logging.getLogger(__name__)
 
@@ -16,10 +21,24 @@ log = logging.getLogger(__name__)
 # OPEN_TOPO_API_KEY = config.get("open-topo", "API_KEY", fallback=None)
 OPEN_TOPO_API_KEY = os.getenv("OPEN_TOPO_API_KEY")
 
+ELEVATION_DIR = "/tmp/data/processed/elevation_windows"  # each run downloads into its own temp dir here
+CORRIDOR_BUFFER = 0.003  # ~300m (degrees) around the route
+CORRIDOR_CELL_SIZE = 0.1  # ~11km (degrees) grid the corridor is cut into before merging
+CORRIDOR_MAX_WASTE = 4  # a merged window's bbox may be at most this multiple of the corridor area it covers
+CORRIDOR_MAX_WINDOW_AREA = 4  # square degrees, caps a single window's decode size
+CORRIDOR_MAX_WINDOWS = 12  # opentopo calls count against a daily quota, cap requests per route
+CORRIDOR_COARSEN_STEPS = 3  # times the grid is doubled to get under the cap before falling back to one bbox
+CORRIDOR_MAX_WORKERS = 4
+# SRTMGL1 (1 arc-second, ~30m) for shorter routes if the largest window fits the memory budget, else SRTMGL3 (~90m)
+SRTMGL1_MAX_ROUTE_KM = 150
+DEM_MEMORY_BUDGET_MB = 64  # peak memory for decoding one window, windows are read one at a time
+DEM_CELL_SIZE = {"SRTMGL1": 1 / 3600, "SRTMGL3": 3 / 3600}
+
 class DataProcessor:
-    def __init__(self, final_route_path):
+    def __init__(self, final_route_path, dem_mode="corridor"):
         self.final_route_path = final_route_path
         self.elevation_url = reference_layers[0]["url"]
+        self.dem_mode = dem_mode  # "corridor" or "bbox"
 
     def process_route(self):
         """filter trailheads, extract elevation, calculate slope, and classify difficulty."""
@@ -27,12 +46,15 @@ class DataProcessor:
 
         self.filter_trailheads()
 
-        elevation_tif = self.query_elevation_tif()
-        if not elevation_tif:
+        elevation_tifs = self.query_elevation_tif()
+        if not elevation_tifs:
             log.error("❌ Failed to download elevation raster. Cannot proceed with processing.")
             return None
 
-        elevation_data = self.extract_elevation_from_raster()
+        try:
+            elevation_data = self.extract_elevation_from_raster(elevation_tifs)
+        finally:
+            shutil.rmtree(os.path.dirname(elevation_tifs[0]), ignore_errors=True)
         if elevation_data is None:
             log.error("❌ Elevation extraction failed.")
             return None
@@ -66,39 +88,173 @@ class DataProcessor:
             "west": min(lons)
         }
 
+    def compute_corridor_windows(self, final_gdf, buffer_distance=CORRIDOR_BUFFER):
+        """cover the buffered route footprint with a small set of windows.
+
+        the footprint is cut into grid cells, then neighbouring cells are merged greedily along the route's
+        main axis while the merged bbox stays close to the corridor area it covers (or is no bigger than
+        requesting the cells separately). a thin east-west route ends up as a single window. if that still
+        takes more than CORRIDOR_MAX_WINDOWS requests, the grid is coarsened and the merge limit relaxed.
+        """
+        buffered = final_gdf.geometry.buffer(buffer_distance)
+        #union_all replaced unary_union in geopandas 1.0
+        footprint = buffered.union_all() if hasattr(buffered, "union_all") else buffered.unary_union
+        if footprint.is_empty:
+            log.error("❌ No valid route geometry to build a DEM corridor from.")
+            return []
+
+        cell_size, max_waste = CORRIDOR_CELL_SIZE, CORRIDOR_MAX_WASTE
+        for _ in range(CORRIDOR_COARSEN_STEPS):
+            windows = self.merge_corridor_cells(footprint, buffer_distance, cell_size, max_waste)
+            if len(windows) <= CORRIDOR_MAX_WINDOWS:
+                break
+            log.info(f"{len(windows)} DEM windows with {cell_size:.2f}° cells, coarsening the corridor grid...")
+            cell_size, max_waste = cell_size * 2, max_waste * 2
+
+        log.info(f"route corridor covered by {len(windows)} DEM window(s)")
+        return windows
+
+    def merge_corridor_cells(self, footprint, buffer_distance, cell_size, max_waste):
+        """cut the footprint into cell_size grid cells and greedily merge neighbours into windows."""
+        minx, miny, maxx, maxy = footprint.bounds
+        #even grid so no cell ends up as a thin sliver
+        nx = max(1, math.ceil((maxx - minx) / cell_size))
+        ny = max(1, math.ceil((maxy - miny) / cell_size))
+        step_x, step_y = (maxx - minx) / nx, (maxy - miny) / ny
+
+        pieces = []
+        for i in range(nx):
+            for j in range(ny):
+                cell = box(minx + i * step_x, miny + j * step_y, minx + (i + 1) * step_x, miny + (j + 1) * step_y)
+                covered = cell.intersection(footprint)
+                if not covered.is_empty:
+                    pieces.append(((i, j), covered.bounds, covered.area))
+
+        #walk cells along the longer side of the route so consecutive cells are neighbours
+        if maxx - minx < maxy - miny:
+            pieces.sort(key=lambda piece: (piece[0][1], piece[0][0]))
+
+        def bbox_area(bounds):
+            return (bounds[2] - bounds[0]) * (bounds[3] - bounds[1])
+
+        merged = []
+        current = None  # [bounds, covered area, area if requested cell by cell]
+        for _, bounds, area in pieces:
+            if current is None:
+                current = [bounds, area, bbox_area(bounds)]
+                continue
+
+            candidate = (
+                min(current[0][0], bounds[0]), min(current[0][1], bounds[1]),
+                max(current[0][2], bounds[2]), max(current[0][3], bounds[3])
+            )
+            covered_area = current[1] + area
+            separate_area = current[2] + bbox_area(bounds)
+            fits = bbox_area(candidate) <= CORRIDOR_MAX_WINDOW_AREA
+            compact = bbox_area(candidate) <= max(max_waste * covered_area, separate_area)
+
+            if fits and compact:
+                current = [candidate, covered_area, separate_area]
+            else:
+                merged.append(current[0])
+                current = [bounds, area, bbox_area(bounds)]
+        if current is not None:
+            merged.append(current[0])
+
+        windows = []
+        for west, south, east, north in merged:
+            #keep windows at least a buffer wide so tiny corners still return a valid raster
+            cx, cy = (west + east) / 2, (south + north) / 2
+            half_x, half_y = max((east - west) / 2, buffer_distance), max((north - south) / 2, buffer_distance)
+            windows.append({"north": cy + half_y, "south": cy - half_y, "east": cx + half_x, "west": cx - half_x})
+
+        return windows
+
+    def choose_dem_type(self, final_gdf, windows):
+        """pick SRTMGL1 for shorter routes when the largest window fits in memory, else SRTMGL3."""
+        route_km = final_gdf.to_crs(final_gdf.estimate_utm_crs()).length.sum() / 1000
+
+        # windows are decoded one at a time, so the largest one sets peak memory. srtm is delivered as int16
+        cell = DEM_CELL_SIZE["SRTMGL1"]
+        largest_pixels = max(
+            math.ceil((w["east"] - w["west"]) / cell) * math.ceil((w["north"] - w["south"]) / cell) for w in windows
+        )
+        largest_mb = largest_pixels * 2 / 1024 ** 2
+
+        demtype = "SRTMGL1" if route_km <= SRTMGL1_MAX_ROUTE_KM and largest_mb <= DEM_MEMORY_BUDGET_MB else "SRTMGL3"
+        log.info(f"route length {route_km:.1f} km, largest SRTMGL1 window ~{largest_mb:.1f} MB -> using {demtype}")
+        return demtype
+
     def query_elevation_tif(self):
-        """query open topo for raster based on the route bounding box."""
+        """query open topo for rasters covering the route. returns a list of raster paths.
+
+        corridor mode requests only small windows along the buffered route, bbox mode the full route bounding box.
+        """
         final_gdf = gpd.read_file(self.final_route_path)
         if final_gdf.empty:
             log.error("❌ Final trip route is empty. Cannot query DEM.")
             return None
 
-        bbox = self.compute_bbox(final_gdf)
-        if not bbox:
-            log.error("❌ Could not compute bounding box. Aborting DEM request.")
+        dem_mode = self.dem_mode
+        if dem_mode == "corridor":
+            windows = self.compute_corridor_windows(final_gdf)
+            if not windows:
+                log.error("❌ Could not compute route corridor. Aborting DEM request.")
+                return None
+            if len(windows) > CORRIDOR_MAX_WINDOWS:
+                log.warning(f"⚠️ corridor still needs {len(windows)} DEM windows, falling back to the route bbox")
+                dem_mode = "bbox"
+            else:
+                demtype = self.choose_dem_type(final_gdf, windows)
+
+        if dem_mode == "bbox":
+            bbox = self.compute_bbox(final_gdf)
+            if not bbox:
+                log.error("❌ Could not compute bounding box. Aborting DEM request.")
+                return None
+            windows = [bbox]
+            demtype = "SRTMGL3"
+
+        #per-run dir so concurrent sessions never touch each other's windows
+        os.makedirs(ELEVATION_DIR, exist_ok=True)
+        raster_dir = tempfile.mkdtemp(prefix="elevation_", dir=ELEVATION_DIR)
+
+        log.info(f"📡 Requesting {demtype} DEM for {len(windows)} window(s) along the route...")
+
+        with ThreadPoolExecutor(max_workers=CORRIDOR_MAX_WORKERS) as executor:
+            raster_paths = list(executor.map(
+                lambda args: self.query_elevation_window(*args, demtype, raster_dir),
+                enumerate(windows)
+            ))
+
+        if not all(raster_paths):
+            log.error("❌ One or more DEM windows failed to download.")
+            shutil.rmtree(raster_dir, ignore_errors=True)
             return None
 
+        log.info(f"received {len(raster_paths)} DEM GeoTIFF window(s) for the route.")
+        return raster_paths
+
+    def query_elevation_window(self, index, window, demtype, raster_dir):
+        """download a single DEM window. returns the saved tif path or None."""
         params = {
-            "demtype": "SRTMGL3",
-            "south": bbox["south"],
-            "north": bbox["north"],
-            "west": bbox["west"],
-            "east": bbox["east"],
+            "demtype": demtype,
+            "south": window["south"],
+            "north": window["north"],
+            "west": window["west"],
+            "east": window["east"],
             "outputFormat": "GTiff",
             "API_Key": OPEN_TOPO_API_KEY
         }
 
-        log.info(f"📡 Requesting DEM for bbox: {bbox}")
-
         try:
-            response = requests.get(self.elevation_url, params=params)
-            response.raise_for_status()
+            response = upstream.get(self.elevation_url, params=params)
 
             if response.headers.get("content-type") == "application/octet-stream":
-                log.info("received DEM GeoTIFF file for requested area.")
-                with open("/tmp/data/processed/elevation.tif", "wb") as f:
+                raster_path = os.path.join(raster_dir, f"elevation_{index}.tif")
+                with open(raster_path, "wb") as f:
                     f.write(response.content)
-                return "/tmp/data/processed/elevation.tif"
+                return raster_path
             else:
                 log.warning(f"Unexpected response format: {response.headers.get('content-type')}")
                 return None
@@ -108,39 +264,53 @@ class DataProcessor:
             return None
 
 
-    def extract_elevation_from_raster(self):
-        """extract elevation values from elevation.tif for each vertex along the final route."""
-        raster_path = "/tmp/data/processed/elevation.tif"
-        log.info("🔄 Extracting elevation values from local raster...")
+    def extract_elevation_from_raster(self, raster_paths):
+        """extract elevation values from the DEM windows for each vertex along the final route."""
+        log.info("🔄 Extracting elevation values from local rasters...")
 
         final_gdf = gpd.read_file(self.final_route_path)
         if final_gdf.empty:
             log.error("❌ Final trip route is empty. Cannot extract elevation.")
             return None
 
-        elevation_data = []
+        #flatten every vertex so each window is read and sampled once
+        segment_coords = []
+        for geom in final_gdf.geometry:
+            coords = [coord for line in geom.geoms for coord in line.coords] if geom.geom_type == "MultiLineString" else list(geom.coords)
+            segment_coords.append(coords)
+
+        all_coords = np.array([coord[:2] for coords in segment_coords for coord in coords], dtype=float).reshape(-1, 2)
+        elevations = np.zeros(len(all_coords))
+        sampled = np.zeros(len(all_coords), dtype=bool)
 
         try:
-            with rasterio.open(raster_path) as src:
-                affine_transform = src.transform
-                height, width = src.shape #raster dimensions
-
-                for index, row in final_gdf.iterrows():
-                    geom = row.geometry
-                    coords = [coord for line in geom.geoms for coord in line.coords] if geom.geom_type == "MultiLineString" else list(geom.coords)
-                    
-                    segment_elevations = []
-                    for lon, lat in coords:
-                        row_idx, col_idx = rowcol(affine_transform, lon, lat)
-
-                        if not (0 <= row_idx < height and 0 <= col_idx < width):
-                            #skipping points outside of bounds of tif/raster
-                            continue 
-
-                        elevation = src.read(1)[row_idx, col_idx]
-                        segment_elevations.append(elevation)
-
-                    elevation_data.append(segment_elevations)
+            for raster_path in raster_paths:
+                remaining = np.flatnonzero(~sampled)
+                if remaining.size == 0:
+                    break
+
+                with rasterio.open(raster_path) as src:
+                    height, width = src.shape #raster dimensions
+                    rows, cols = rowcol(src.transform, all_coords[remaining, 0], all_coords[remaining, 1])
+                    rows, cols = np.asarray(rows), np.asarray(cols)
+
+                    #skipping points outside of bounds of this window
+                    in_bounds = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+                    if not in_bounds.any():
+                        continue
+
+                    band = src.read(1)
+                    hits = remaining[in_bounds]
+                    elevations[hits] = band[rows[in_bounds], cols[in_bounds]]
+                    sampled[hits] = True
+
+            #rebuild per-segment lists, points outside every window are skipped
+            elevation_data = []
+            offset = 0
+            for coords in segment_coords:
+                idx = slice(offset, offset + len(coords))
+                elevation_data.append(list(elevations[idx][sampled[idx]]))
+                offset += len(coords)
 
             log.info("✅ Elevation extraction from raster complete.")
             return elevation_data
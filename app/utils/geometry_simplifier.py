@@ -0,0 +1,225 @@
+import os
+import json
+import math
+import logging
+import threading
+from collections import OrderedDict
+import geopandas as gpd
+from shapely.geometry import LineString, MultiLineString, box
+from shapely.ops import substring
+
+# detail levels served to the map. tolerance is in degrees (data is 4326),
+# roughly half a screen pixel at the zoom the level is meant for. viewport
+# requests are snapped outward to a grid of `tile` degrees so pans reuse results.
+DETAIL_LEVELS = {
+    "low": {"tolerance": 0.001, "precision": 4, "tile": 1.0},       # ~100m, overview zooms (< 9)
+    "medium": {"tolerance": 0.0002, "precision": 5, "tile": 0.25},  # ~20m, zooms 9-10
+    "high": {"tolerance": 0.00005, "precision": 5, "tile": 0.1},    # ~5m, zooms 11-12
+    "full": {"tolerance": None, "precision": 6, "tile": 0.05},      # all vertices, ~0.1m grid
+}
+DEFAULT_DETAIL = "full"
+BBOX_CACHE_SIZE = 64  # snapped viewport results kept per dataset version
+
+
+class GeometrySimplifier:
+    """precomputes simplified + quantized geojson per detail level, cached per dataset version."""
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def level_for_zoom(zoom):
+        """pick a detail level for a mapbox zoom level."""
+        if zoom < 9:
+            return "low"
+        elif zoom < 11:
+            return "medium"
+        elif zoom < 13:
+            return "high"
+        return "full"
+
+    @staticmethod
+    def dataset_version(path):
+        """file mtime + size identifies a saved dataset, rewritten on every fetch/process."""
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def precompute(self, paths):
+        """build every detail level for the given datasets so the first map load is served from cache.
+
+        the datasets are treated as one network, so junctions between them are kept.
+        """
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            self.logger.info(f"Building detail levels for {os.path.basename(path)}...")
+            self._get_entry(path, [other for other in paths if other != path])
+
+    def get_geojson(self, path, detail=DEFAULT_DETAIL, bbox=None, network=()):
+        """return a geojson dict for the dataset at the requested detail, optionally clipped to a bbox.
+
+        network lists other datasets the lines connect to (e.g. roads for trails) so shared junctions stay put.
+        """
+        if detail not in DETAIL_LEVELS:
+            raise ValueError(f"Unknown detail level '{detail}'. Expected one of {list(DETAIL_LEVELS)}.")
+
+        entry = self._get_entry(path, network)
+        gdf, geojson = entry["levels"][detail]
+
+        if bbox is None:
+            return geojson
+
+        key = (detail, self._snap_bbox(bbox, DETAIL_LEVELS[detail]["tile"]))
+        with self._lock:
+            clipped = entry["bbox_cache"].get(key)
+            if clipped is not None:
+                entry["bbox_cache"].move_to_end(key)
+                return clipped
+
+        #features are already serialized & quantized in row order, just pick the ones in the snapped bbox
+        rows = sorted(gdf.sindex.query(box(*key[1]))) if not gdf.empty else []
+        clipped = {"type": "FeatureCollection", "features": [geojson["features"][i] for i in rows]}
+
+        with self._lock:
+            entry["bbox_cache"][key] = clipped
+            if len(entry["bbox_cache"]) > BBOX_CACHE_SIZE:
+                entry["bbox_cache"].popitem(last=False)
+
+        return clipped
+
+    @staticmethod
+    def _snap_bbox(bbox, tile):
+        minX, minY, maxX, maxY = bbox
+        return (
+            math.floor(minX / tile) * tile, math.floor(minY / tile) * tile,
+            math.ceil(maxX / tile) * tile, math.ceil(maxY / tile) * tile
+        )
+
+    def _get_entry(self, path, network=()):
+        network = [other for other in network if os.path.exists(other)]
+        version = tuple(self.dataset_version(p) for p in [path, *network])
+
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached and cached["version"] == version:
+                return cached
+
+        gdf = self._read_4326(path)
+
+        #junctions don't depend on the tolerance, find them once per dataset
+        is_line = gdf.geom_type.isin(["LineString", "MultiLineString"])
+        other_lines = []
+        for other in network:
+            other_gdf = self._read_4326(other)
+            other_lines.extend(other_gdf.geometry[other_gdf.geom_type.isin(["LineString", "MultiLineString"])])
+        junctions = self._find_junctions(gdf.loc[is_line, "geometry"], other_lines)
+
+        levels = {}
+        for name, level in DETAIL_LEVELS.items():
+            level_gdf = self._simplify(gdf, level["tolerance"], junctions)
+            levels[name] = (level_gdf, self._to_geojson(level_gdf, level["precision"]))
+
+        # only the latest version of each dataset is kept
+        entry = {"version": version, "levels": levels, "bbox_cache": OrderedDict()}
+        with self._lock:
+            self._cache[path] = entry
+
+        return entry
+
+    @staticmethod
+    def _read_4326(path):
+        gdf = gpd.read_file(path)
+        if gdf.crs is not None and gdf.crs != "EPSG:4326":
+            gdf = gdf.to_crs(epsg=4326)
+        return gdf
+
+    def _simplify(self, gdf, tolerance, junctions):
+        """simplify line geometries without moving junctions, points are left as is.
+
+        simplify(preserve_topology=True) only keeps each geometry valid on its own, so a trail meeting a
+        road mid-line could drift off it. lines are cut at the points where they touch another feature,
+        each piece is simplified (its end points never move) and the pieces are joined back together.
+        """
+        if not tolerance or gdf.empty:
+            return gdf
+
+        simplified = gdf.copy()
+        is_line = simplified.geom_type.isin(["LineString", "MultiLineString"])
+        lines = simplified.loc[is_line, "geometry"]
+
+        simplified.loc[is_line, "geometry"] = [
+            self._simplify_line(geom, junctions[i], tolerance) for i, geom in enumerate(lines)
+        ]
+        return simplified
+
+    def _find_junctions(self, lines, other_lines=()):
+        """points where each line touches another line (of this dataset or other_lines), as a list per line."""
+        junctions = [[] for _ in range(len(lines))]
+        geoms = gpd.GeoSeries([*lines, *other_lines])
+        if len(geoms) < 2:
+            return junctions
+
+        sindex = geoms.sindex
+        for i, geom in enumerate(geoms[:len(lines)]):
+            for j in sindex.query(geom, predicate="intersects"):
+                if j == i:
+                    continue
+                touch = geom.intersection(geoms.iloc[j])
+                parts = touch.geoms if hasattr(touch, "geoms") else [touch]
+                for part in parts:
+                    if part.geom_type == "Point":
+                        junctions[i].append(part)
+                    elif part.geom_type == "LineString":
+                        #overlapping stretch, keep where it starts and ends
+                        junctions[i].extend(part.boundary.geoms)
+        return junctions
+
+    def _simplify_line(self, geom, junctions, tolerance):
+        parts = [geom] if geom.geom_type == "LineString" else list(geom.geoms)
+
+        simplified_parts = []
+        for part in parts:
+            cuts = sorted({0, part.length} | {part.project(p) for p in junctions if part.distance(p) < 1e-9})
+
+            coords = []
+            for start, end in zip(cuts, cuts[1:]):
+                if end <= start:
+                    continue
+                piece = substring(part, start, end).simplify(tolerance, preserve_topology=True)
+                piece_coords = list(piece.coords)
+                coords.extend(piece_coords[1:] if coords else piece_coords)
+
+            simplified_parts.append(LineString(coords) if len(coords) >= 2 else part)
+
+        if geom.geom_type == "LineString":
+            return simplified_parts[0]
+        return MultiLineString(simplified_parts)
+
+    def _to_geojson(self, gdf, precision):
+        geojson = json.loads(gdf.to_json())
+        for feature in geojson["features"]:
+            geometry = feature.get("geometry")
+            if geometry and "coordinates" in geometry:
+                geometry["coordinates"] = self._quantize(geometry["coordinates"], precision)
+        return geojson
+
+    def _quantize(self, coords, precision):
+        """round coordinates and drop consecutive vertices that collapse onto the same grid point."""
+        if not coords:
+            return coords
+        if isinstance(coords[0], (int, float)):
+            return [round(c, precision) for c in coords]
+
+        quantized = [self._quantize(c, precision) for c in coords]
+        if quantized[0] and isinstance(quantized[0][0], (int, float)):
+            deduped = [quantized[0]]
+            for coord in quantized[1:]:
+                if coord != deduped[-1]:
+                    deduped.append(coord)
+            # a line needs at least two vertices, a closed ring four
+            min_vertices = 4 if quantized[0] == quantized[-1] and len(quantized) > 2 else 2
+            if len(deduped) >= min_vertices:
+                return deduped
+        return quantized
@@ -0,0 +1,272 @@
+import time
+import random
+import logging
+import threading
+from urllib.parse import urlparse
+import requests
+from app.reference_layers import upstream_limits
+
+log = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = {
+    "rate": 5,              # tokens per second
+    "burst": 10,            # bucket size
+    "timeout": (5, 30),     # (connect, read) seconds
+    "max_retries": 3,
+    "backoff_base": 0.5,    # seconds, doubled each retry
+    "backoff_max": 8,
+    "failure_threshold": 5, # consecutive failed calls before the breaker opens
+    "reset_timeout": 30,    # seconds the breaker stays open
+    "query_timeout": 300,   # seconds for a whole multi-request call (arcgis queries page through results)
+    "max_abandoned": 2,     # timed-out calls still running before new calls to the host fail fast
+}
+
+# error classes returned by classify_error
+RETRY = "retry"  # transport failure, try again and count against the host if it keeps failing
+FAIL = "fail"    # host failure not worth retrying, counted against the host
+RAISE = "raise"  # bad request or local bug, re-raised as is
+
+
+class UpstreamUnavailable(requests.exceptions.RequestException):
+    """raised when the circuit breaker for a host is open, so callers fail fast."""
+
+
+class UpstreamTimeout(requests.exceptions.Timeout):
+    """raised when a call given a timeout is abandoned. its thread may still be running, so it is never retried."""
+
+
+class TokenBucket:
+    """per-host rate limit. acquire() blocks until a token is free."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """opens after too many consecutive failures, then lets a single trial call through after reset_timeout."""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self.trial_in_flight:
+                return False
+            # half-open
+            self.trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def release_trial(self):
+        """a half-open trial ended without telling us anything about the host."""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class UpstreamClient:
+    """shared client for upstream services (ArcGIS, OpenTopography, OpenWeather).
+
+    identical concurrent requests are coalesced into one upstream call, and every
+    call goes through a per-host token bucket, bounded retries with jittered
+    backoff and a circuit breaker.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = limits or {}
+        self._buckets = {}
+        self._breakers = {}
+        self._in_flight = {}
+        self._abandoned = {}
+        self._lock = threading.Lock()
+
+    def host_limits(self, host):
+        return {**DEFAULT_LIMITS, **self.limits.get(host, {})}
+
+    def get(self, url, params=None):
+        """coalesced, rate limited GET. returns the requests.Response, raises RequestException on failure."""
+        host = urlparse(url).netloc
+        timeout = self.host_limits(host)["timeout"]
+
+        def send():
+            response = requests.get(url, params=params, timeout=timeout)
+            response.raise_for_status()
+            return response
+
+        return self.call(host, ("GET", url, self.normalize_params(params)), send)
+
+    def call(self, host, key, fn, timeout=None, classify=None):
+        """run fn() for host, sharing the result with any concurrent caller using the same key.
+
+        if timeout is given fn runs on its own thread and is abandoned after timeout seconds, for calls
+        with no timeout of their own. classify maps an exception to RETRY, FAIL or RAISE
+        (defaults to classify_error).
+        """
+        with self._lock:
+            in_flight = self._in_flight.get(key)
+            leader = in_flight is None
+            if leader:
+                in_flight = self._in_flight[key] = _InFlight()
+
+        if not leader:
+            log.info(f"Joining in-flight request to {host}")
+            if not in_flight.done.wait(self._max_call_time(host, timeout)):
+                raise UpstreamUnavailable(f"Timed out waiting for in-flight request to {host}")
+            if in_flight.error:
+                raise in_flight.error
+            return in_flight.result
+
+        try:
+            if timeout is not None:
+                attempt = lambda: self._run_with_timeout(host, fn, timeout)
+            else:
+                attempt = fn
+            in_flight.result = self._call_with_retries(host, attempt, classify or self.classify_error)
+            return in_flight.result
+        except Exception as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            in_flight.done.set()
+
+    def _call_with_retries(self, host, fn, classify):
+        """one logical call: up to max_retries retries of transport failures, counted once by the breaker."""
+        limits = self.host_limits(host)
+        bucket, breaker = self._get_host_state(host, limits)
+
+        if not breaker.allow():
+            raise UpstreamUnavailable(f"{host} is unavailable (circuit open), try again later")
+
+        for attempt in range(limits["max_retries"] + 1):
+            bucket.acquire()
+            try:
+                result = fn()
+            except Exception as e:
+                kind = classify(e)
+                if kind == RAISE:
+                    # bad request or local bug, not the host's fault
+                    breaker.release_trial()
+                    raise
+                if kind == FAIL or attempt == limits["max_retries"]:
+                    breaker.record_failure()
+                    raise
+                # full jitter backoff
+                delay = random.uniform(0, min(limits["backoff_max"], limits["backoff_base"] * 2 ** attempt))
+                log.warning(f"Request to {host} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+
+    def _run_with_timeout(self, host, fn, timeout):
+        """run fn on a dedicated daemon thread. a thread that outlives its timeout is left to finish on
+        its own, and only max_abandoned of those are allowed per host before calls fail fast."""
+        with self._lock:
+            abandoned = [t for t in self._abandoned.get(host, []) if t.is_alive()]
+            self._abandoned[host] = abandoned
+            if len(abandoned) >= self.host_limits(host)["max_abandoned"]:
+                raise UpstreamUnavailable(f"{host} still has {len(abandoned)} timed out call(s) running, try again later")
+
+        outcome = {}
+
+        def run():
+            try:
+                outcome["result"] = fn()
+            except Exception as e:
+                outcome["error"] = e
+
+        thread = threading.Thread(target=run, name=f"upstream-{host}", daemon=True)
+        thread.start()
+        thread.join(timeout)
+
+        if thread.is_alive():
+            with self._lock:
+                self._abandoned.setdefault(host, []).append(thread)
+            raise UpstreamTimeout(f"Upstream call to {host} timed out after {timeout}s")
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+    def _max_call_time(self, host, timeout=None):
+        """upper bound for a leader's call, used to bound how long coalesced followers wait."""
+        limits = self.host_limits(host)
+        attempts = limits["max_retries"] + 1
+        per_attempt = timeout if timeout is not None else sum(limits["timeout"])
+        return attempts * per_attempt + limits["max_retries"] * limits["backoff_max"]
+
+    def _get_host_state(self, host, limits):
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(limits["rate"], limits["burst"])
+                self._breakers[host] = CircuitBreaker(limits["failure_threshold"], limits["reset_timeout"])
+            return self._buckets[host], self._breakers[host]
+
+    @staticmethod
+    def classify_error(error):
+        """only transport failures are retried: connection errors, timeouts, 429 and 5xx."""
+        if isinstance(error, (UpstreamTimeout, UpstreamUnavailable)):
+            return FAIL
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return RETRY
+        if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+            status = error.response.status_code
+            return RETRY if status == 429 or status >= 500 else RAISE
+        return RAISE
+
+    @staticmethod
+    def normalize_params(params, precision=6):
+        """hashable, order-independent form of query params. floats are rounded so near-identical bboxes coalesce."""
+        if not params:
+            return ()
+        if isinstance(params, dict):
+            params = params.items()
+        return tuple(sorted(
+            (k, round(v, precision) if isinstance(v, float) else str(v)) for k, v in params
+        ))
+
+
+upstream = UpstreamClient(upstream_limits)